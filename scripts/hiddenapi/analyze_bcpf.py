@@ -15,8 +15,10 @@
 # limitations under the License.
 """Analyze bootclasspath_fragment usage."""
 import argparse
+import concurrent.futures
 import dataclasses
 import enum
+import fcntl
 import json
 import logging
 import os
@@ -25,6 +27,7 @@ import shutil
 import subprocess
 import tempfile
 import textwrap
+import threading
 import typing
 from enum import Enum
 
@@ -32,12 +35,29 @@ import sys
 
 from signature_trie import signature_trie
 
+# orjson is much faster than json at decoding large files like
+# module-info.json but it is not always available so fall back to json.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 _STUB_FLAGS_FILE = "out/soong/hiddenapi/hiddenapi-stub-flags.txt"
 
 _FLAGS_FILE = "out/soong/hiddenapi/hiddenapi-flags.csv"
 
 _INCONSISTENT_FLAGS = "ERROR: Hidden API flags are inconsistent:"
 
+# The size of the buffer used when reading the output of the build, and of the
+# kernel pipe that carries it where that can be changed. The build can produce
+# a lot of output so a large buffer reduces the number of read() calls and
+# prevents the build from stalling while waiting for this to drain the pipe.
+_BUILD_OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# The fcntl command to set the size of a pipe, only available on Linux. It is
+# not exposed by the fcntl module prior to Python 3.10.
+_F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
 
 class BuildOperation:
 
@@ -51,7 +71,9 @@ class BuildOperation:
         The lines have had any trailing white space, including the newline
         stripped.
         """
-        return newline_stripping_iter(self.popen.stdout.readline)
+        # Iterate over the buffered stdout stream directly rather than calling
+        # readline() for each line.
+        return (line.rstrip() for line in self.popen.stdout)
 
     def wait(self, *args, **kwargs):
         self.popen.wait(*args, **kwargs)
@@ -74,33 +96,52 @@ class ModuleInfo:
     are defined.
     """
 
-    modules: typing.Dict[str, typing.Dict[str, typing.Any]]
+    # Map from module name to the path of the directory containing the file in
+    # which the module is defined. Only the paths are retained from the
+    # module-info.json file as that is all that is needed and the full file
+    # can be very large.
+    modules: typing.Dict[str, str]
+
+    # Map from module name to the paths of those modules that do not have a
+    # single unique path.
+    invalid_module_paths: typing.Dict[str,
+                                      typing.Set[str]] = dataclasses.field(
+                                          default_factory=dict)
 
     @staticmethod
     def load(filename):
-        with open(filename, "r", encoding="utf8") as f:
-            j = json.load(f)
-            return ModuleInfo(j)
+        if orjson:
+            with open(filename, "rb") as f:
+                j = orjson.loads(f.read())
+        else:
+            with open(filename, "r", encoding="utf8") as f:
+                j = json.load(f)
+
+        modules = {}
+        invalid_module_paths = {}
+        for module_name, module in j.items():
+            # The "path" is actually a list of paths, one for each class of
+            # module but as the modules are all created from bp files if a
+            # module does create multiple classes of make modules they should
+            # all have the same path.
+            paths = module.get("path", [])
+            if paths and all(p == paths[0] for p in paths[1:]):
+                modules[module_name] = paths[0]
+            else:
+                invalid_module_paths[module_name] = set(paths)
+        return ModuleInfo(modules, invalid_module_paths)
 
-    def _module(self, module_name):
-        """Find module by name in module-info.json file"""
+    def module_path(self, module_name):
+        """Find the path of the module by name in module-info.json file"""
         if module_name in self.modules:
             return self.modules[module_name]
 
-        raise Exception(f"Module {module_name} could not be found")
-
-    def module_path(self, module_name):
-        module = self._module(module_name)
-        # The "path" is actually a list of paths, one for each class of module
-        # but as the modules are all created from bp files if a module does
-        # create multiple classes of make modules they should all have the same
-        # path.
-        paths = module["path"]
-        unique_paths = set(paths)
-        if len(unique_paths) != 1:
+        if module_name in self.invalid_module_paths:
+            paths = self.invalid_module_paths[module_name]
             raise Exception(f"Expected module '{module_name}' to have a "
-                            f"single unique path but found {unique_paths}")
-        return paths[0]
+                            f"single unique path but found {paths}")
+
+        raise Exception(f"Module {module_name} could not be found")
 
 
 def extract_indent(line):
@@ -140,6 +181,25 @@ class FileChange:
         return self.path < other.path
 
 
+@dataclasses.dataclass
+class HiddenApiFlagsFile:
+    """A flags file in frameworks/base/boot/hiddenapi to be checked."""
+
+    # The name of the bootclasspath_fragment hidden_api property that will
+    # reference the bootclasspath_fragment specific version of the file.
+    property_name: str
+
+    # The path to the file in frameworks/base/boot/hiddenapi.
+    flags_file: str
+
+    # The path to the bootclasspath_fragment specific file relative to the
+    # directory containing the bootclasspath_fragment.
+    rel_bcpf_flags_file: str
+
+    # The absolute path to the bootclasspath_fragment specific file.
+    bcpf_flags_file: str
+
+
 class PropertyChangeAction(Enum):
     """Allowable actions that are supported by HiddenApiPropertyChange."""
 
@@ -163,16 +223,17 @@ class HiddenApiPropertyChange:
     action: PropertyChangeAction = PropertyChangeAction.APPEND
 
     def snippet(self, indent):
-        snippet = "\n"
-        snippet += format_comment_as_text(self.property_comment, indent)
-        snippet += f"{indent}{self.property_name}: ["
+        parts = [
+            "\n",
+            format_comment_as_text(self.property_comment, indent),
+            f"{indent}{self.property_name}: [",
+        ]
         if self.values:
-            snippet += "\n"
-            for value in self.values:
-                snippet += f'{indent}    "{value}",\n'
-            snippet += f"{indent}"
-        snippet += "],\n"
-        return snippet
+            parts.append("\n")
+            parts.extend(f'{indent}    "{value}",\n' for value in self.values)
+            parts.append(indent)
+        parts.append("],\n")
+        return "".join(parts)
 
     def fix_bp_file(self, bcpf_bp_file, bcpf, bpmodify_runner: BpModifyRunner):
         # Add an additional placeholder value to identify the modification that
@@ -376,6 +437,18 @@ class ClassProvider(enum.Enum):
     OTHER = "other"
 
 
+# Matches the names of the files in frameworks/base/boot/hiddenapi that contain
+# hidden API flags.
+_is_hiddenapi_flags_file = re.compile(r"hiddenapi-.*\.txt").fullmatch
+
+# Map from the names of files in frameworks/base/boot/hiddenapi to the more
+# meaningful names used for the corresponding bootclasspath_fragment files.
+_HIDDENAPI_FLAGS_FILE_RENAMES = {
+    "hiddenapi-max-target-o.txt": "hiddenapi-max-target-o-low-priority.txt",
+    "hiddenapi-max-target-r-loprio.txt":
+        "hiddenapi-max-target-r-low-priority.txt",
+}
+
 # A fake member to use when using the signature trie to compute the package
 # properties from hidden API flags. This is needed because while that
 # computation only cares about classes the trie expects a class to be an
@@ -384,6 +457,10 @@ class ClassProvider(enum.Enum):
 # its own entry but is used as an interior node for inner classes.
 _FAKE_MEMBER = ";->fake()V"
 
+# Matches a line break that is followed by a line that does not start with
+# white space, used to reflow the text passed to BcpfAnalyzer.report().
+_REPORT_REFLOW = re.compile(r"(.)\n([^\s])")
+
 
 @dataclasses.dataclass()
 class BcpfAnalyzer:
@@ -426,9 +503,19 @@ class BcpfAnalyzer:
     # load_module_info().
     module_info: ModuleInfo = None
 
+    # The path to the directory containing the bootclasspath_fragment's
+    # Android.bp file, initialized lazily by the bcpf_dir property.
+    _bcpf_dir: typing.Optional[str] = None
+
+    # The threads removing stale files, started by remove_stale_files().
+    _cleanup_threads: typing.List[threading.Thread] = dataclasses.field(
+        default_factory=list)
+
     @staticmethod
     def reformat_report_test(text):
-        return re.sub(r"(.)\n([^\s])", r"\1 \2", text)
+        if "\n" not in text:
+            return text
+        return _REPORT_REFLOW.sub(r"\1 \2", text)
 
     def report(self, text="", **kwargs):
         # Concatenate lines that are not separated by a blank line together to
@@ -460,6 +547,12 @@ class BcpfAnalyzer:
             raise Exception("signatures has not been initialized")
         return self._signatures
 
+    @property
+    def bcpf_dir(self):
+        if self._bcpf_dir is None:
+            self._bcpf_dir = self.module_path(self.bcpf)
+        return self._bcpf_dir
+
     @property
     def classes(self):
         if not self._classes:
@@ -471,13 +564,14 @@ class BcpfAnalyzer:
             "all-flags.csv")
 
         # Extract the set of signatures and a separate set of classes produced
-        # by the bootclasspath_fragment.
-        with open(all_flags, "r", encoding="utf8") as f:
-            for line in newline_stripping_iter(f.readline):
-                signature = self.line_to_signature(line)
-                self._signatures.add(signature)
-                class_name = self.signature_to_class(signature)
-                self._classes.add(class_name)
+        # by the bootclasspath_fragment. The file can be large so read it in one
+        # go and use comprehensions rather than processing it line by line.
+        lines = read_lines(all_flags)
+        signatures = (line.partition(",")[0].rstrip() for line in lines)
+        self._signatures = {signature for signature in signatures if signature}
+        self._classes = {
+            signature.partition(";->")[0] for signature in self._signatures
+        }
 
     def load_module_info(self):
         module_info_file = os.path.join(self.product_out_dir,
@@ -485,13 +579,19 @@ class BcpfAnalyzer:
         self.report(f"\nMaking sure that {module_info_file} is up to date.\n")
         output = self.build_file_read_output(module_info_file)
         lines = output.lines()
-        for line in lines:
-            logging.debug("%s", line)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for line in lines:
+                logging.debug("%s", line)
+        else:
+            # Drain the output so that the build does not block.
+            for _ in lines:
+                pass
         output.wait(timeout=10)
         if output.returncode:
             raise Exception(f"Error building {module_info_file}")
         abs_module_info_file = os.path.join(self.top_dir, module_info_file)
         self.module_info = ModuleInfo.load(abs_module_info_file)
+        self._bcpf_dir = None
 
     @staticmethod
     def line_to_signature(line):
@@ -510,19 +610,16 @@ class BcpfAnalyzer:
 
     def module_out_dir(self, module_name):
         module_path = self.module_path(module_name)
-        return os.path.join(self.out_dir, "soong/.intermediates", module_path,
-                            module_name)
+        # The module path is always relative so there is no need to use
+        # os.path.join().
+        return (f"{self.out_dir}/soong/.intermediates/"
+                f"{module_path}/{module_name}")
 
     def find_bootclasspath_fragment_output_file(self, basename, required=True):
         # Find the output file of the bootclasspath_fragment with the specified
         # base name.
-        found_file = ""
         bcpf_out_dir = self.module_out_dir(self.bcpf)
-        for (dirpath, _, filenames) in os.walk(bcpf_out_dir):
-            for f in filenames:
-                if f == basename:
-                    found_file = os.path.join(dirpath, f)
-                    break
+        found_file = next(find_files(bcpf_out_dir, basename), "")
         if not found_file and required:
             raise Exception(f"Could not find {basename} in {bcpf_out_dir}")
         return found_file
@@ -590,11 +687,12 @@ class BcpfAnalyzer:
         self.report_dedent("""
             Cleaning potentially stale files.
             """)
-        # Remove the out/soong/hiddenapi files.
-        shutil.rmtree(f"{self.out_dir}/soong/hiddenapi", ignore_errors=True)
-
-        # Remove any bootclasspath_fragment output files.
-        shutil.rmtree(self.module_out_dir(self.bcpf), ignore_errors=True)
+        self.remove_stale_files([
+            # Remove the out/soong/hiddenapi files.
+            f"{self.out_dir}/soong/hiddenapi",
+            # Remove any bootclasspath_fragment output files.
+            self.module_out_dir(self.bcpf),
+        ])
 
         self.build_monolithic_stubs_flags()
 
@@ -607,7 +705,7 @@ class BcpfAnalyzer:
         # If there were any changes that need to be made to the Android.bp
         # file then either apply or report them.
         if result.property_changes:
-            bcpf_dir = self.module_info.module_path(self.bcpf)
+            bcpf_dir = self.bcpf_dir
             bcpf_bp_file = os.path.join(self.top_dir, bcpf_dir, "Android.bp")
             if self.fix:
                 tool_dir = os.path.dirname(self.tool_path)
@@ -665,14 +763,32 @@ merge these properties into it.
                     make the above changes.
                     """.lstrip("\n"))
 
+    def remove_stale_files(self, dirs):
+        """Start removing the directories in the background.
+
+        The directories are disjoint so they are removed in parallel. Any
+        build must call wait_for_stale_files_removal() first to make sure that
+        the removal has finished.
+        """
+        for d in dirs:
+            thread = threading.Thread(
+                target=shutil.rmtree, args=(d,), kwargs={"ignore_errors": True})
+            thread.start()
+            self._cleanup_threads.append(thread)
+
+    def wait_for_stale_files_removal(self):
+        for thread in self._cleanup_threads:
+            thread.join()
+        self._cleanup_threads.clear()
+
     def new_file_change(self, file, description):
         return FileChange(
             path=os.path.relpath(file, self.top_dir), description=description)
 
-    def check_inconsistent_flag_lines(self, significant, module_line,
+    def check_inconsistent_flag_lines(self, log_lines, module_line,
                                       monolithic_line, separator_line):
-        if not (module_line.startswith("< ") and
-                monolithic_line.startswith("> ") and not separator_line):
+        if (module_line[:2] != "< " or monolithic_line[:2] != "> " or
+                separator_line):
             # Something went wrong.
             self.report("Invalid build output detected:")
             self.report(f"  module_line: '{module_line}'")
@@ -680,12 +796,40 @@ merge these properties into it.
             self.report(f"  separator_line: '{separator_line}'")
             sys.exit(1)
 
-        if significant:
+        if log_lines:
             logging.debug("%s", module_line)
             logging.debug("%s", monolithic_line)
             logging.debug("%s", separator_line)
 
-    def scan_inconsistent_flags_report(self, lines):
+    @staticmethod
+    def read_inconsistent_flags_report(lines):
+        """Reads the lines of a hidden API flags report from the build output
+
+        The basic format of an entry in the inconsistent flags report is:
+          <module specific flag>
+          <monolithic flag>
+          <separator>
+
+        The report ends when a separator line (other than the one following
+        the header) is not blank. That line is the start of the following
+        output, and possibly the start of another report.
+
+        Returns a tuple of the list of lines in the report, which is always a
+        multiple of 3 long and has a blank separator line at the end of each
+        entry, and the line that follows the report or "" if there is none.
+        """
+        report = []
+        for line in lines:
+            if line and len(report) % 3 == 2 and len(report) > 3:
+                report.append("")
+                return report, line
+            report.append(line)
+
+        # Discard any incomplete entry at the end of the output.
+        del report[len(report) - len(report) % 3:]
+        return report, ""
+
+    def scan_inconsistent_flags_report(self, report):
         """Scans a hidden API flags report
 
         The hidden API inconsistent flags report which looks something like
@@ -697,42 +841,44 @@ merge these properties into it.
         < Landroid/compat/Compatibility;->clearOverrides()V
         > Landroid/compat/Compatibility;->clearOverrides()V,core-platform-api
 
+        The report is a list of lines as returned by
+        read_inconsistent_flags_report().
         """
+        if not report:
+            return {}
 
-        # The basic format of an entry in the inconsistent flags report is:
-        #   <module specific flag>
-        #   <monolithic flag>
-        #   <separator>
-        #
-        # Wrap the lines iterator in an iterator which returns a tuple
-        # consisting of the three separate lines.
-        triples = zip(lines, lines, lines)
-
-        module_line, monolithic_line, separator_line = next(triples)
+        module_line, monolithic_line, separator_line = report[0:3]
         significant = False
-        bcpf_dir = self.module_info.module_path(self.bcpf)
-        if os.path.join(bcpf_dir, self.bcpf) in module_line:
+        if os.path.join(self.bcpf_dir, self.bcpf) in module_line:
             # These errors are related to the bcpf being analyzed so
             # keep them.
             significant = True
         else:
             self.report(f"Filtering out errors related to {module_line}")
 
-        self.check_inconsistent_flag_lines(significant, module_line,
+        # Only log the lines of significant reports, and only check whether
+        # debug logging is enabled once per report.
+        log_lines = significant and logging.getLogger().isEnabledFor(
+            logging.DEBUG)
+
+        self.check_inconsistent_flag_lines(log_lines, module_line,
                                            monolithic_line, separator_line)
 
         diffs = {}
-        for module_line, monolithic_line, separator_line in triples:
-            self.check_inconsistent_flag_lines(significant, module_line,
-                                               monolithic_line, "")
+        for i in range(3, len(report), 3):
+            module_line = report[i]
+            monolithic_line = report[i + 1]
+            separator_line = report[i + 2]
+            self.check_inconsistent_flag_lines(log_lines, module_line,
+                                               monolithic_line, separator_line)
 
-            module_parts = module_line.removeprefix("< ").split(",")
-            module_signature = module_parts[0]
-            module_flags = module_parts[1:]
+            # The "< " and "> " prefixes have already been checked so just
+            # skip over them.
+            module_signature, _, rest = module_line[2:].partition(",")
+            module_flags = rest.split(",") if rest else []
 
-            monolithic_parts = monolithic_line.removeprefix("> ").split(",")
-            monolithic_signature = monolithic_parts[0]
-            monolithic_flags = monolithic_parts[1:]
+            monolithic_signature, _, rest = monolithic_line[2:].partition(",")
+            monolithic_flags = rest.split(",") if rest else []
 
             if module_signature != monolithic_signature:
                 # Something went wrong.
@@ -743,12 +889,7 @@ merge these properties into it.
 
             diffs[module_signature] = (module_flags, monolithic_flags)
 
-            if separator_line:
-                # If the separator line is not blank then it is the end of the
-                # current report, and possibly the start of another.
-                return separator_line, diffs
-
-        return "", diffs
+        return diffs
 
     def build_file_read_output(self, filename):
         # Make sure the filename is relative to top if possible as the build
@@ -764,18 +905,27 @@ merge these properties into it.
             stderr=subprocess.STDOUT,
             stdout=subprocess.PIPE,
             text=True,
+            bufsize=_BUILD_OUTPUT_BUFFER_SIZE,
         )
+        enlarge_pipe(output.stdout)
         return BuildOperation(popen=output)
 
     def build_hiddenapi_flags(self, filename):
+        # The build must not start until the stale files have been removed.
+        self.wait_for_stale_files_removal()
         output = self.build_file_read_output(filename)
 
         lines = output.lines()
         diffs = None
+        # Avoid the cost of calling logging.debug() for every line of the
+        # build output when debug logging is disabled.
+        debug_enabled = logging.getLogger().isEnabledFor(logging.DEBUG)
         for line in lines:
-            logging.debug("%s", line)
+            if debug_enabled:
+                logging.debug("%s", line)
             while line == _INCONSISTENT_FLAGS:
-                line, diffs = self.scan_inconsistent_flags_report(lines)
+                report, line = self.read_inconsistent_flags_report(lines)
+                diffs = self.scan_inconsistent_flags_report(report)
 
         output.wait(timeout=10)
         if output.returncode != 0:
@@ -911,26 +1061,29 @@ merge these properties into it.
                 """)
             self.check_frameworks_base_boot_hidden_api_files(result)
 
+    def find_bcpf_signatures(self, flags_file):
+        """Find the signatures in the flags file that are provided by the
+        bootclasspath_fragment.
+        """
+        # Read the flags from the flags file.
+        file_signatures = set(map(str.rstrip, read_lines(flags_file)))
+
+        # Any signatures provided by the bootclasspath_fragment will need to be
+        # moved to the bootclasspath_fragment specific file.
+        return file_signatures & self.signatures
+
     def report_hidden_api_flag_file_changes(self, result, property_name,
                                             flags_file, rel_bcpf_flags_file,
-                                            bcpf_flags_file):
-        matched_signatures = set()
-        # Open the flags file to read the flags from.
-        with open(flags_file, "r", encoding="utf8") as f:
-            for signature in newline_stripping_iter(f.readline):
-                if signature in self.signatures:
-                    # The signature is provided by the bootclasspath_fragment so
-                    # it will need to be moved to the bootclasspath_fragment
-                    # specific file.
-                    matched_signatures.add(signature)
-
+                                            bcpf_flags_file,
+                                            matched_signatures):
         # If the bootclasspath_fragment specific flags file is not empty
         # then it contains flags. That could either be new flags just moved
         # from frameworks/base or previous contents of the file. In either
         # case the file must not be removed.
         if matched_signatures:
-            insert = textwrap.indent("\n".join(matched_signatures),
-                                     "            ")
+            insert = "\n".join(
+                f"            {signature}"
+                for signature in sorted(matched_signatures))
             result.file_changes.append(
                 self.new_file_change(
                     flags_file, f"""Remove the following entries:
@@ -962,6 +1115,7 @@ merge these properties into it.
 
         bcpf_flags_file_exists = os.path.exists(bcpf_flags_file)
 
+        signatures = self.signatures
         matched_signatures = set()
         # Open the flags file to read the flags from.
         with open(flags_file, "r", encoding="utf8") as f:
@@ -973,7 +1127,7 @@ merge these properties into it.
                 with open(bcpf_flags_file, "a", encoding="utf8") as b:
                     for line in iter(f.readline, ""):
                         signature = line.rstrip()
-                        if signature in self.signatures:
+                        if signature in signatures:
                             # The signature is provided by the
                             # bootclasspath_fragment so write it to the new
                             # bootclasspath_fragment specific file.
@@ -1027,9 +1181,11 @@ merge these properties into it.
     def check_frameworks_base_boot_hidden_api_files(self, result):
         hiddenapi_dir = os.path.join(self.top_dir,
                                      "frameworks/base/boot/hiddenapi")
+        abs_bcpf_dir = os.path.join(self.top_dir, self.bcpf_dir)
+
+        flags_files = []
         for basename in sorted(os.listdir(hiddenapi_dir)):
-            if not (basename.startswith("hiddenapi-") and
-                    basename.endswith(".txt")):
+            if not _is_hiddenapi_flags_file(basename):
                 continue
 
             flags_file = os.path.join(hiddenapi_dir, basename)
@@ -1040,28 +1196,47 @@ merge these properties into it.
             # Map the file name in frameworks/base/boot/hiddenapi into a
             # slightly more meaningful name for use by the
             # bootclasspath_fragment.
-            if basename == "hiddenapi-max-target-o.txt":
-                basename = "hiddenapi-max-target-o-low-priority.txt"
-            elif basename == "hiddenapi-max-target-r-loprio.txt":
-                basename = "hiddenapi-max-target-r-low-priority.txt"
+            basename = _HIDDENAPI_FLAGS_FILE_RENAMES.get(basename, basename)
 
             property_name = basename.removeprefix("hiddenapi-")
             property_name = property_name.removesuffix(".txt")
             property_name = property_name.replace("-", "_")
 
             rel_bcpf_flags_file = f"hiddenapi/{basename}"
-            bcpf_dir = self.module_info.module_path(self.bcpf)
-            bcpf_flags_file = os.path.join(self.top_dir, bcpf_dir,
-                                           rel_bcpf_flags_file)
+            bcpf_flags_file = os.path.join(abs_bcpf_dir, rel_bcpf_flags_file)
 
-            if self.fix:
-                self.fix_hidden_api_flag_files(result, property_name,
-                                               flags_file, rel_bcpf_flags_file,
-                                               bcpf_flags_file)
-            else:
+            flags_files.append(
+                HiddenApiFlagsFile(
+                    property_name=property_name,
+                    flags_file=flags_file,
+                    rel_bcpf_flags_file=rel_bcpf_flags_file,
+                    bcpf_flags_file=bcpf_flags_file,
+                ))
+
+        if self.fix:
+            for f in flags_files:
+                self.fix_hidden_api_flag_files(
+                    result,
+                    property_name=f.property_name,
+                    flags_file=f.flags_file,
+                    rel_bcpf_flags_file=f.rel_bcpf_flags_file,
+                    bcpf_flags_file=f.bcpf_flags_file)
+        else:
+            # The flags files are independent of each other so read them in
+            # parallel. The results are applied in order afterwards so that
+            # the output is deterministic.
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                matches = list(
+                    executor.map(self.find_bcpf_signatures,
+                                 [f.flags_file for f in flags_files]))
+            for f, matched_signatures in zip(flags_files, matches):
                 self.report_hidden_api_flag_file_changes(
-                    result, property_name, flags_file, rel_bcpf_flags_file,
-                    bcpf_flags_file)
+                    result,
+                    property_name=f.property_name,
+                    flags_file=f.flags_file,
+                    rel_bcpf_flags_file=f.rel_bcpf_flags_file,
+                    bcpf_flags_file=f.bcpf_flags_file,
+                    matched_signatures=matched_signatures)
 
     @staticmethod
     def split_package_comment(split_packages):
@@ -1235,7 +1410,8 @@ merge these properties into it.
         # Populate the trie with the classes that are provided by the
         # bootclasspath_fragment tagging them to make it clear where they
         # are from.
-        sorted_classes = sorted(self.classes)
+        classes = self.classes
+        sorted_classes = sorted(classes)
         for class_name in sorted_classes:
             trie.add(class_name + _FAKE_MEMBER, ClassProvider.BCPF)
 
@@ -1247,7 +1423,7 @@ merge these properties into it.
                 signature = self.line_to_signature(line)
                 class_name = self.signature_to_class(signature)
                 if (class_name not in monolithic_classes and
-                        class_name not in self.classes):
+                        class_name not in classes):
                     trie.add(
                         class_name + _FAKE_MEMBER,
                         ClassProvider.OTHER,
@@ -1377,11 +1553,53 @@ merge these properties into it.
                 self.recurse_hiddenapi_packages_trie(child, result)
 
 
-def newline_stripping_iter(iterator):
-    """Return an iterator over the iterator that strips trailing white space."""
-    lines = iter(iterator, "")
-    lines = (line.rstrip() for line in lines)
-    return lines
+def read_lines(filename):
+    """Return a list of the lines in the file, without line endings.
+
+    The file is read as bytes and then decoded which is slightly quicker than
+    reading it in text mode as it avoids translating the line endings, which
+    splitlines() handles anyway.
+    """
+    with open(filename, "rb") as f:
+        return f.read().decode("utf8").splitlines()
+
+
+def find_files(path, basename):
+    """Return an iterator over the files called basename within path.
+
+    The directory tree is traversed lazily using os.scandir() so that the
+    caller can stop as soon as it has found what it needs. Directories that
+    cannot be read, including path itself, are ignored.
+    """
+    try:
+        with os.scandir(path) as entries:
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name == basename and entry.is_file(
+                        follow_symlinks=False):
+                    yield entry.path
+    except OSError:
+        return
+
+    for subdir in subdirs:
+        yield from find_files(subdir, basename)
+
+
+def enlarge_pipe(stream):
+    """Try and increase the size of the kernel pipe underlying the stream.
+
+    This is only supported on Linux and the size is limited by
+    /proc/sys/fs/pipe-max-size so any failure is ignored as the pipe will still
+    work, just less efficiently.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        fcntl.fcntl(stream.fileno(), _F_SETPIPE_SZ, _BUILD_OUTPUT_BUFFER_SIZE)
+    except OSError as e:
+        logging.debug("Could not resize pipe: %s", e)
 
 
 def format_comment_as_text(text, indent):
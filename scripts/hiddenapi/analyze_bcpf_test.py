@@ -16,6 +16,7 @@
 """Unit tests for analyzing bootclasspath_fragment modules."""
 import os.path
 import shutil
+import subprocess
 import tempfile
 import unittest
 import unittest.mock
@@ -85,7 +86,7 @@ class TestAnalyzeBcpf(unittest.TestCase):
         product_out_dir = "out/product"
 
         bcpf_dir = f"{bcpf}-dir"
-        modules = {bcpf: {"path": [bcpf_dir]}}
+        modules = {bcpf: bcpf_dir}
         module_info = ab.ModuleInfo(modules)
 
         analyzer = ab.BcpfAnalyzer(
@@ -119,6 +120,128 @@ that traverses multiple lines.
    that should not be reformatted.
 """, reformatted)
 
+    def test_module_info_load(self):
+        module_info_file = os.path.join(self.test_dir, "module-info.json")
+        self.write_abs_file(
+            module_info_file, """
+{
+  "bcpf": {"class": ["FAKE"], "path": ["bcpf-dir", "bcpf-dir"]},
+  "other": {"class": ["FAKE"], "path": ["other-dir"]}
+}
+""")
+        module_info = ab.ModuleInfo.load(module_info_file)
+        self.assertEqual("bcpf-dir", module_info.module_path("bcpf"))
+        self.assertEqual("other-dir", module_info.module_path("other"))
+
+    def test_module_info_load_multiple_paths(self):
+        module_info_file = os.path.join(self.test_dir, "module-info.json")
+        self.write_abs_file(
+            module_info_file, """
+{
+  "bcpf": {"class": ["FAKE"], "path": ["bcpf-dir", "other-dir"]}
+}
+""")
+        module_info = ab.ModuleInfo.load(module_info_file)
+        with self.assertRaisesRegex(Exception, "single unique path"):
+            module_info.module_path("bcpf")
+        with self.assertRaisesRegex(Exception, "could not be found"):
+            module_info.module_path("other")
+
+    def test_load_all_flags_ignores_blank_lines(self):
+        fs = {
+            "out/soong/.intermediates/bcpf-dir/bcpf/all-flags.csv":
+                "La/b/C;->m()V,blocked\n\n  \t\nLa/b/D;->m()V\n",
+        }
+        analyzer = self.create_analyzer_for_test(fs)
+        self.assertEqual({"La/b/C;->m()V", "La/b/D;->m()V"},
+                         analyzer.signatures)
+        self.assertEqual({"La/b/C", "La/b/D"}, analyzer.classes)
+
+    def test_remove_stale_files(self):
+        fs = {
+            "out/soong/hiddenapi/hiddenapi-flags.csv": "",
+            "out/soong/.intermediates/bcpf-dir/bcpf/all-flags.csv": "",
+            "out/soong/.intermediates/other-dir/other/all-flags.csv": "",
+        }
+        analyzer = self.create_analyzer_for_test(fs)
+        analyzer.remove_stale_files([
+            os.path.join(self.test_dir, "out/soong/hiddenapi"),
+            analyzer.module_out_dir("bcpf"),
+        ])
+        analyzer.wait_for_stale_files_removal()
+
+        out_dir = os.path.join(self.test_dir, "out/soong")
+        self.assertFalse(os.path.exists(os.path.join(out_dir, "hiddenapi")))
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(out_dir, ".intermediates/bcpf-dir/bcpf")))
+        self.assertTrue(
+            os.path.exists(os.path.join(out_dir, ".intermediates/other-dir")))
+
+    def test_build_operation_lines(self):
+        # pylint: disable=consider-using-with
+        popen = subprocess.Popen(
+            [sys.executable, "-c", "print('first  \\nsecond\\t\\n\\nlast')"],
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1024 * 1024,
+        )
+        ab.enlarge_pipe(popen.stdout)
+        operation = ab.BuildOperation(popen)
+        lines = list(operation.lines())
+        operation.wait(timeout=10)
+        popen.stdout.close()
+        self.assertEqual(["first", "second", "", "last"], lines)
+        self.assertEqual(0, operation.returncode)
+
+    def test_read_inconsistent_flags_report(self):
+        lines = iter("""
+< out/soong/.intermediates/bcpf-dir/bcpf-dir/filtered-flags.csv
+> out/soong/hiddenapi/hiddenapi-flags.csv
+
+< Lacme/test/Class;-><init>()V,blocked
+> Lacme/test/Class;-><init>()V,max-target-o
+
+< Lacme/test/Other;->getThing()Z,blocked
+> Lacme/test/Other;->getThing()Z,max-target-p
+16:37:32 ninja failed with: exit status 1
+After the report
+""".strip("\n").splitlines())
+
+        report, next_line = ab.BcpfAnalyzer.read_inconsistent_flags_report(
+            lines)
+        self.assertEqual([
+            "< out/soong/.intermediates/bcpf-dir/bcpf-dir/filtered-flags.csv",
+            "> out/soong/hiddenapi/hiddenapi-flags.csv",
+            "",
+            "< Lacme/test/Class;-><init>()V,blocked",
+            "> Lacme/test/Class;-><init>()V,max-target-o",
+            "",
+            "< Lacme/test/Other;->getThing()Z,blocked",
+            "> Lacme/test/Other;->getThing()Z,max-target-p",
+            "",
+        ], report)
+        self.assertEqual("16:37:32 ninja failed with: exit status 1",
+                         next_line)
+        self.assertEqual(["After the report"], list(lines))
+
+    def test_read_inconsistent_flags_report_truncated(self):
+        lines = iter("""
+< out/soong/.intermediates/bcpf-dir/bcpf-dir/filtered-flags.csv
+> out/soong/hiddenapi/hiddenapi-flags.csv
+
+< Lacme/test/Class;-><init>()V,blocked
+""".strip("\n").splitlines())
+
+        report, next_line = ab.BcpfAnalyzer.read_inconsistent_flags_report(
+            lines)
+        self.assertEqual([
+            "< out/soong/.intermediates/bcpf-dir/bcpf-dir/filtered-flags.csv",
+            "> out/soong/hiddenapi/hiddenapi-flags.csv",
+            "",
+        ], report)
+        self.assertEqual("", next_line)
+
     def do_test_build_flags(self, fix):
         lines = """
 ERROR: Hidden API flags are inconsistent: